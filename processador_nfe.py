@@ -1,15 +1,146 @@
 import os
+import io
+import copy
+import errno
+import hashlib
+import concurrent.futures
 import sqlite3
 import yaml
 import logging
 import logging.handlers
 import time
 import shutil
+from collections import OrderedDict
 from pathlib import Path
+import re
+import itertools
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import xmltodict
-from datetime import datetime
+from watchdog.events import PatternMatchingEventHandler
+import asyncio
+from lxml import etree
+from datetime import date
+
+try:
+    import aiofiles
+except ImportError:
+    # Dependência opcional: sem ela a leitura do backlog inicial é síncrona
+    aiofiles = None
+
+# Diretório base do script, resolvido uma única vez na carga do módulo:
+# cada .resolve() dispara syscalls de realpath e o resultado nunca muda
+_BASE_DIR = Path(__file__).parent.resolve()
+
+# Logger do módulo com formatação preguiçosa ('%s' + argumentos): a mensagem só
+# é montada se algum handler realmente for gravá-la, ao contrário das f-strings,
+# que pagavam a formatação mesmo com o nível filtrado.
+logger = logging.getLogger(__name__)
+
+def _texto(elemento, caminho, padrao=''):
+    """Retorna o texto de um sub-elemento (busca com namespace curinga) ou o padrão"""
+    no = elemento.find(caminho)
+    if no is None or no.text is None:
+        return padrao
+    return no.text
+
+def _numero(elemento, caminho, _float=float):
+    """Retorna o texto de um sub-elemento convertido para float, ou 0.0"""
+    # _float=float liga o conversor como variável local, evitando a busca
+    # global por chamada no laço de itens
+    no = elemento.find(caminho)
+    if no is None or no.text is None:
+        return 0.0
+    try:
+        return _float(no.text)
+    except ValueError:
+        return 0.0
+
+# Instruções SQL usadas a cada NFe, definidas uma única vez: o sqlite3 mantém
+# um cache de statements preparados por texto da instrução, então reutilizar
+# exatamente a mesma string evita reinterpretar o SQL a cada chamada.
+_SQL_INSERT_CABECALHO = """
+    INSERT OR REPLACE INTO nfe_cabecalho (
+        chave_acesso, numero_nf, serie, data_emissao,
+        data_saida_entrada, tipo_operacao, cnpj_emitente, nome_emitente,
+        cnpj_destinatario, nome_destinatario, valor_total, valor_icms,
+        valor_pis, valor_cofins, arquivo_xml, caminho_original, hash_xml
+    ) VALUES (
+        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
+_SQL_CHECA_DUPLICATA = """
+    SELECT 1 FROM nfe_cabecalho WHERE chave_acesso = ? AND hash_xml = ? LIMIT 1
+"""
+
+_SQL_DELETE_ITENS = 'DELETE FROM nfe_itens WHERE chave_acesso = ?'
+
+_SQL_INSERT_ITEM = """
+    INSERT INTO nfe_itens (
+        chave_acesso, numero_item, codigo_produto, descricao_produto,
+        cfop, unidade_comercial, quantidade_comercial, valor_unitario_comercial,
+        valor_total_produto, valor_icms, valor_pis, valor_cofins
+    ) VALUES (
+        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
+# Posição de cada campo de <prod> na tupla do item (mesma ordem das colunas de
+# _SQL_INSERT_ITEM). Com esse despacho pré-computado, a extração percorre os
+# filhos de <prod> uma única vez escrevendo direto na linha, em vez de fazer
+# uma busca find() por campo.
+_INDICE_CAMPOS_PROD = {
+    'cProd': 2,
+    'xProd': 3,
+    'CFOP': 4,
+    'uCom': 5,
+    'qCom': 6,
+    'vUnCom': 7,
+    'vProd': 8
+}
+
+# Campos de <prod> que entram na linha como float
+_CAMPOS_PROD_NUMERICOS = frozenset(('qCom', 'vUnCom', 'vProd'))
+
+# Variantes conhecidas de cada grupo de imposto: o grupo (<ICMS>, <PIS>,
+# <COFINS>) carrega exatamente um filho com uma dessas tags contendo os
+# valores. Procurar pela lista explícita, em vez de pegar o primeiro filho
+# qualquer, ignora nós estranhos ao leiaute da NFe.
+_TAGS_ICMS = frozenset((
+    'ICMS00', 'ICMS10', 'ICMS20', 'ICMS30', 'ICMS40', 'ICMS51', 'ICMS60',
+    'ICMS70', 'ICMS90', 'ICMSSN101', 'ICMSSN102', 'ICMSSN201', 'ICMSSN202',
+    'ICMSSN500', 'ICMSSN900'
+))
+
+_TAGS_PIS = frozenset(('PISAliq', 'PISQtde', 'PISNT', 'PISOutr'))
+
+_TAGS_COFINS = frozenset(('COFINSAliq', 'COFINSQtde', 'COFINSNT', 'COFINSOutr'))
+
+def _variante_imposto(grupo, tags_conhecidas):
+    """Retorna o filho do grupo de imposto cuja tag é uma variante conhecida"""
+    for filho in grupo:
+        # Comentários não têm tag textual e quebrariam o QName
+        if isinstance(filho.tag, str) and etree.QName(filho).localname in tags_conhecidas:
+            return filho
+    return None
+
+# Cache das configurações já interpretadas, chaveado pelo caminho do arquivo.
+# Cada entrada guarda (mtime, tamanho, configurações); se o arquivo não mudou,
+# o YAML não é interpretado de novo. Limitado às entradas mais recentes (LRU).
+_CACHE_CONFIGURACOES = OrderedDict()
+_CACHE_CONFIGURACOES_MAXIMO = 100
+
+def _mesclar_padroes(destino, origem):
+    """
+    Completa o dicionário destino com os valores padrão de origem.
+
+    Desce recursivamente em dicionários aninhados (como 'rotacao') e só
+    preenche chaves ausentes, sem sobrescrever o que o usuário configurou.
+    """
+    for chave, valor in origem.items():
+        if isinstance(valor, dict) and isinstance(destino.get(chave), dict):
+            _mesclar_padroes(destino[chave], valor)
+        else:
+            destino.setdefault(chave, valor)
 
 def carregar_configuracoes(arquivo_config=None):
     """
@@ -21,11 +152,8 @@ def carregar_configuracoes(arquivo_config=None):
     Returns:
         dict: Dicionário com as configurações organizadas por seção
     """
-    # Diretório base do script
-    base_dir = Path(__file__).parent.resolve()
-
     if arquivo_config is None:
-        arquivo_config = base_dir / 'config.yaml'
+        arquivo_config = _BASE_DIR / 'config.yaml'
     else:
         arquivo_config = Path(arquivo_config)
 
@@ -54,6 +182,19 @@ def carregar_configuracoes(arquivo_config=None):
 
     try:
         if arquivo_config.exists():
+            # Verificar se o arquivo já foi carregado e não mudou desde então
+            # (mtime + tamanho detectam alterações sem reler o conteúdo)
+            chave_cache = str(arquivo_config)
+            info_arquivo = arquivo_config.stat()
+            assinatura = (info_arquivo.st_mtime, info_arquivo.st_size)
+
+            entrada = _CACHE_CONFIGURACOES.get(chave_cache)
+            if entrada is not None and entrada[0] == assinatura:
+                _CACHE_CONFIGURACOES.move_to_end(chave_cache)
+                # Cópia profunda para que quem chamou possa alterar o dicionário
+                # sem corromper o cache
+                return copy.deepcopy(entrada[1])
+
             print(f'Carregando configurações de: {arquivo_config}')
 
             with open(arquivo_config, 'r', encoding='utf-8') as f:
@@ -67,19 +208,14 @@ def carregar_configuracoes(arquivo_config=None):
                     configuracoes.update(doc)
 
             # Verificar e completar configurações faltantes
-            for secao, config_padrao in configuracoes_padrao.items():
-                if secao not in configuracoes:
-                    configuracoes[secao] = config_padrao
-                else:
-                    # Verificar sub-configurações
-                    for chave, valor_padrao in config_padrao.items():
-                        if chave not in configuracoes[secao]:
-                            configuracoes[secao][chave] = valor_padrao
-                        elif isinstance(valor_padrao, dict) and isinstance(configuracoes[secao][chave], dict):
-                            # Verificar configurações aninhadas (como rotacao)
-                            for sub_chave, sub_valor_padrao in valor_padrao.items():
-                                if sub_chave not in configuracoes[secao][chave]:
-                                    configuracoes[secao][chave][sub_chave] = sub_valor_padrao
+            _mesclar_padroes(configuracoes, configuracoes_padrao)
+
+            # Guardar no cache para as próximas chamadas, descartando a entrada
+            # mais antiga quando o limite é atingido
+            _CACHE_CONFIGURACOES[chave_cache] = (assinatura, copy.deepcopy(configuracoes))
+            _CACHE_CONFIGURACOES.move_to_end(chave_cache)
+            while len(_CACHE_CONFIGURACOES) > _CACHE_CONFIGURACOES_MAXIMO:
+                _CACHE_CONFIGURACOES.popitem(last=False)
 
             print('Configurações carregadas com sucesso')
             return configuracoes
@@ -105,11 +241,8 @@ def configurar_logging(config_log):
     Args:
         config_log (dict): Configurações de logging
     """
-    # Diretório base do script
-    base_dir = Path(__file__).parent.resolve()
-
     # Criar pasta de logs se não existir
-    pasta_log = (base_dir / config_log['pasta_log']).resolve() # Converte esse caminho em um caminho absoluto, eliminando possíveis referências relativas como . ou ...
+    pasta_log = (_BASE_DIR / config_log['pasta_log']).resolve() # Converte esse caminho em um caminho absoluto, eliminando possíveis referências relativas como . ou ...
     pasta_log.mkdir(parents=True, exist_ok=True)
 
     # Arquivo de log
@@ -137,17 +270,309 @@ def configurar_logging(config_log):
     )
 
     # Log inicial
-    logging.info('=' * 60)
-    logging.info('Sistema de logging configurado')
-    logging.info(f'Pasta de logs: {pasta_log}')
-    logging.info(f'Arquivo de log: {caminho_log}')
-    logging.info(f'Rotação: {config_log["rotacao"]["when"]} - Intervalo: {config_log["rotacao"]["interval"]} - Backup: {config_log["rotacao"]["backup_count"]}')
-    logging.info('=' * 60)
-
-class ProcessadorNFe(FileSystemEventHandler):
+    logger.info('=' * 60)
+    logger.info('Sistema de logging configurado')
+    logger.info('Pasta de logs: %s', pasta_log)
+    logger.info('Arquivo de log: %s', caminho_log)
+    logger.info('Rotação: %s - Intervalo: %s - Backup: %s', config_log["rotacao"]["when"], config_log["rotacao"]["interval"], config_log["rotacao"]["backup_count"])
+    logger.info('=' * 60)
+
+# A chave de acesso aparece no atributo Id="NFe<44 dígitos>" logo no começo do
+# XML; uma leitura curta + regex a recupera sem interpretar o documento
+_REGEX_CHAVE_ACESSO = re.compile(rb'Id="NFe(\d{44})"')
+
+def _chave_acesso_rapida(arquivo, tamanho_leitura=2048):
+    """
+    Extrai a chave de acesso lendo apenas o início do arquivo.
+
+    Args:
+        arquivo (Path): Arquivo XML de NFe
+        tamanho_leitura (int): Quantos bytes do início examinar
+
+    Returns:
+        str: Chave de acesso, ou None se não aparecer no trecho lido
+    """
+    try:
+        with open(arquivo, 'rb') as f:
+            inicio = f.read(tamanho_leitura)
+    except OSError:
+        return None
+
+    resultado = _REGEX_CHAVE_ACESSO.search(inicio)
+    return resultado.group(1).decode('ascii') if resultado else None
+
+def _mover_rapido(origem, destino):
+    """
+    Move um arquivo preferindo os.rename, que resolve com uma única syscall.
+
+    shutil.move sempre paga a lógica de stat + cópia de fallback; como origem
+    e destino normalmente ficam no mesmo sistema de arquivos, o rename direto
+    basta. Entre sistemas de arquivos diferentes (EXDEV) cai para shutil.move.
+    """
+    try:
+        os.rename(origem, destino)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            shutil.move(str(origem), str(destino))
+        else:
+            raise
+
+def _ler_arquivos(caminhos, leituras_simultaneas=128):
+    """
+    Lê o conteúdo de vários arquivos, sobrepondo a espera de disco.
+
+    Com aiofiles disponível, as leituras do lote são emitidas de forma
+    concorrente (limitadas por um semáforo) em vez de uma por vez; sem a
+    dependência, cai para leitura síncrona sequencial.
+
+    Args:
+        caminhos (list[Path]): Arquivos a ler
+        leituras_simultaneas (int): Máximo de leituras em andamento
+
+    Returns:
+        list: Pares (caminho, bytes); o conteúdo é None quando a leitura falhou
+    """
+    if aiofiles is None:
+        resultados = []
+        for caminho in caminhos:
+            try:
+                with open(caminho, 'rb') as f:
+                    resultados.append((caminho, f.read()))
+            except OSError:
+                resultados.append((caminho, None))
+        return resultados
+
+    async def _ler_todos():
+        semaforo = asyncio.Semaphore(leituras_simultaneas)
+
+        async def _ler_um(caminho):
+            try:
+                async with semaforo:
+                    async with aiofiles.open(caminho, 'rb') as f:
+                        return caminho, await f.read()
+            except OSError:
+                return caminho, None
+
+        return await asyncio.gather(*(_ler_um(caminho) for caminho in caminhos))
+
+    return asyncio.run(_ler_todos())
+
+def _iterar_arquivos_xml(raiz, recursivo=True):
+    """
+    Gera os arquivos .xml sob a pasta raiz usando os.scandir.
+
+    Diferente de rglob + list, os arquivos são produzidos conforme encontrados,
+    sem materializar a árvore inteira em memória; cada entrada já traz o tipo
+    (arquivo/pasta) preenchido pelo próprio scandir, sem stat extra.
+
+    Args:
+        raiz (Path): Pasta inicial da varredura
+        recursivo (bool): Se True, desce nas subpastas
+
+    Yields:
+        Path: Caminho de cada arquivo .xml encontrado
+    """
+    pendentes = [str(raiz)]
+
+    while pendentes:
+        pasta = pendentes.pop()
+        try:
+            entradas = os.scandir(pasta)
+        except OSError as e:
+            # Pasta sem permissão de leitura (ou removida no meio da varredura)
+            # não pode derrubar a varredura inteira: registra e segue
+            logger.warning('Pasta ignorada na varredura: %s (%s)', pasta, e)
+            continue
+
+        with entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    if recursivo:
+                        pendentes.append(entrada.path)
+                elif entrada.name.lower().endswith('.xml') and entrada.is_file():
+                    yield Path(entrada.path)
+
+def converter_data(data_str):
+    """Converte string de data (ISO 8601, AAAA-MM-DD) para formato SQLite"""
+    # O formato é fixo, então fatiar a string dispensa o strptime, que
+    # reinterpreta o formato e passa por tratamento de locale a cada chamada
+    if not data_str or len(data_str) < 10:
+        return None
+    try:
+        return date(int(data_str[0:4]), int(data_str[5:7]), int(data_str[8:10]))
+    except ValueError:
+        return None
+
+def extrair_dados_nfe_stream(arquivo_xml):
+    """
+    Extrai cabeçalho e itens da NFe a partir do caminho do arquivo.
+
+    Lê os bytes uma única vez e delega para extrair_dados_nfe_bytes;
+    o hash do conteúdo aproveita essa mesma leitura.
+    """
+    with open(arquivo_xml, 'rb') as f:
+        conteudo_xml = f.read()
+
+    return extrair_dados_nfe_bytes(conteudo_xml)
+
+def extrair_dados_nfe_bytes(conteudo_xml):
+    """
+    Extrai cabeçalho e itens da NFe a partir dos bytes do XML.
+
+    Usa etree.iterparse para visitar apenas os nós de interesse
+    (ide/emit/dest/ICMSTot/det) e descarta cada trecho depois de lido,
+    sem montar a árvore inteira em memória.
+    """
+    try:
+        chave_acesso = ''
+        cabecalho = None
+        itens = []
+
+        # Campos preenchidos conforme os blocos do XML vão terminando
+        dados_ide = {}
+        dados_emit = {}
+        dados_dest = {}
+        dados_totais = {}
+
+        hash_xml = hashlib.blake2b(conteudo_xml, digest_size=16).hexdigest()
+
+        contexto = etree.iterparse(
+            io.BytesIO(conteudo_xml),
+            events=('start', 'end'),
+            tag=('{*}infNFe', '{*}ide', '{*}emit', '{*}dest', '{*}ICMSTot', '{*}det')
+        )
+
+        for evento, elem in contexto:
+            nome_tag = etree.QName(elem).localname
+
+            if evento == 'start':
+                # A chave de acesso está no atributo Id de infNFe,
+                # disponível já na abertura da tag
+                if nome_tag == 'infNFe':
+                    chave_acesso = (elem.get('Id') or '').replace('NFe', '')
+                continue
+
+            if nome_tag == 'ide':
+                dados_ide = {
+                    'numero_nf': _texto(elem, '{*}nNF'),
+                    'serie': _texto(elem, '{*}serie'),
+                    'data_emissao': converter_data(_texto(elem, '{*}dEmi')),
+                    'data_saida_entrada': converter_data(_texto(elem, '{*}dSaiEnt')),
+                    'tipo_operacao': _texto(elem, '{*}natOp')
+                }
+            elif nome_tag == 'emit':
+                dados_emit = {
+                    'cnpj_emitente': _texto(elem, '{*}CNPJ'),
+                    'nome_emitente': _texto(elem, '{*}xNome')
+                }
+            elif nome_tag == 'dest':
+                dados_dest = {
+                    'cnpj_destinatario': _texto(elem, '{*}CNPJ'),
+                    'nome_destinatario': _texto(elem, '{*}xNome')
+                }
+            elif nome_tag == 'ICMSTot':
+                dados_totais = {
+                    'valor_total': _numero(elem, '{*}vNF'),
+                    'valor_icms': _numero(elem, '{*}vICMS'),
+                    'valor_pis': _numero(elem, '{*}vPIS'),
+                    'valor_cofins': _numero(elem, '{*}vCOFINS')
+                }
+            elif nome_tag == 'det':
+                # Linha na mesma ordem das colunas de _SQL_INSERT_ITEM, para
+                # o executemany consumir a lista direto, sem re-empacotar
+                linha = [
+                    chave_acesso,
+                    int(elem.get('nItem', 0)),
+                    '', '', '', '',          # cProd, xProd, CFOP, uCom
+                    0.0, 0.0, 0.0,           # qCom, vUnCom, vProd
+                    0.0, 0.0, 0.0            # vICMS, vPIS, vCOFINS
+                ]
+
+                # Uma única passada pelos filhos de <prod>, escrevendo cada
+                # campo na posição definida em _INDICE_CAMPOS_PROD
+                prod = elem.find('{*}prod')
+                if prod is not None:
+                    for campo in prod:
+                        # Comentários e instruções de processamento não têm tag
+                        # textual e quebrariam o QName
+                        if not isinstance(campo.tag, str):
+                            continue
+                        nome_campo = etree.QName(campo).localname
+                        indice = _INDICE_CAMPOS_PROD.get(nome_campo)
+                        if indice is None or campo.text is None:
+                            continue
+                        if nome_campo in _CAMPOS_PROD_NUMERICOS:
+                            try:
+                                linha[indice] = float(campo.text)
+                            except ValueError:
+                                pass
+                        else:
+                            linha[indice] = campo.text
+
+                # Cada grupo de imposto traz uma única variante conhecida
+                # (ICMS00, ICMS20, PISAliq, ...) contendo os valores
+                icms = elem.find('{*}imposto/{*}ICMS')
+                if icms is not None:
+                    variante = _variante_imposto(icms, _TAGS_ICMS)
+                    if variante is not None:
+                        linha[9] = _numero(variante, '{*}vICMS')
+
+                pis = elem.find('{*}imposto/{*}PIS')
+                if pis is not None:
+                    variante = _variante_imposto(pis, _TAGS_PIS)
+                    if variante is not None:
+                        linha[10] = _numero(variante, '{*}vPIS')
+
+                cofins = elem.find('{*}imposto/{*}COFINS')
+                if cofins is not None:
+                    variante = _variante_imposto(cofins, _TAGS_COFINS)
+                    if variante is not None:
+                        linha[11] = _numero(variante, '{*}vCOFINS')
+
+                itens.append(tuple(linha))
+
+            # Liberar o trecho já processado e os irmãos anteriores para
+            # manter o consumo de memória constante
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    # Dados do cabeçalho
+        cabecalho = {
+            'chave_acesso': chave_acesso,
+            'numero_nf': dados_ide.get('numero_nf', ''),
+            'serie': dados_ide.get('serie', ''),
+            'data_emissao': dados_ide.get('data_emissao'),
+            'data_saida_entrada': dados_ide.get('data_saida_entrada'),
+            'tipo_operacao': dados_ide.get('tipo_operacao', ''),
+            'cnpj_emitente': dados_emit.get('cnpj_emitente', ''),
+            'nome_emitente': dados_emit.get('nome_emitente', ''),
+            'cnpj_destinatario': dados_dest.get('cnpj_destinatario', ''),
+            'nome_destinatario': dados_dest.get('nome_destinatario', ''),
+            'valor_total': dados_totais.get('valor_total', 0.0),
+            'valor_icms': dados_totais.get('valor_icms', 0.0),
+            'valor_pis': dados_totais.get('valor_pis', 0.0),
+            'valor_cofins': dados_totais.get('valor_cofins', 0.0),
+            'hash_xml': hash_xml
+        }
+
+        return cabecalho, itens
+
+    except etree.XMLSyntaxError as e:
+        logger.error('Erro ao extrair dados da NFe: %s', e)
+        # Os erros do lxml carregam objetos que não podem ser serializados entre
+        # processos; converter para ValueError preserva a mensagem quando a
+        # extração roda no pool de processos.
+        raise ValueError(f'XML inválido: {e}') from None
+    except Exception as e:
+        logger.error('Erro ao extrair dados da NFe: %s', e)
+        raise # Relança a exceção, fazendo com que ela suba para a função processar_xml, que foi quem chamou extrair_dados_nfe_stream.
+
+class ProcessadorNFe(PatternMatchingEventHandler):
     """
     Classe principal que gerencia o processamento de arquivos XML de NFe.
-    Herda de FileSystemEventHandler para responder a eventos do sistema de arquivos.
+    Herda de PatternMatchingEventHandler para responder a eventos do sistema de
+    arquivos já filtrados por padrão de nome.
     """
 
 
@@ -158,10 +583,12 @@ class ProcessadorNFe(FileSystemEventHandler):
         Args:
             config_processador (dict): Configurações do processador
         """
-        super().__init__() # Chamaro construtor da classe pai.
+        # O filtro de padrão acontece no próprio watchdog, antes do dispatch,
+        # então eventos de arquivos que não são XML nem chegam aos handlers
+        super().__init__(patterns=['*.xml'], ignore_directories=True, case_sensitive=False)
 
-        # Diretório base do script
-        self.base_dir = Path(__file__).parent.resolve()
+        # Diretório base do script (resolvido uma vez na carga do módulo)
+        self.base_dir = _BASE_DIR
 
         # Armazenar configurações
         self.config = config_processador
@@ -175,18 +602,26 @@ class ProcessadorNFe(FileSystemEventHandler):
         # Configuração de busca recursiva
         self.busca_recursiva = self.config.get('busca_recursiva', True)
 
+        # Últimos contadores usados por gerar_nome_unico, por (pasta, nome, extensão)
+        self.contadores_nomes = {}
+
+        # Agrupamento de commits na varredura inicial: quantas NFes gravadas
+        # ainda não confirmadas e de quantas em quantas confirmar
+        self.gravacoes_pendentes = 0
+        self.commit_a_cada = 256
+
         # Criar pastas necessárias
         self.criar_pastas()
 
         # Inicializar banco de dados
         self.inicializar_banco()
 
-        logging.info('Processador de NFe inicializado')
-        logging.info(f'Pasta XML: {self.pasta_xml}')
-        logging.info(f'Pasta processados: {self.pasta_processados}')
-        logging.info(f'Pasta erros: {self.pasta_erros}')
-        logging.info(f'Banco de dados: {self.banco_dados}')
-        logging.info(f'Busca recursiva: {"Ativada" if self.busca_recursiva else "Desativada"}')
+        logger.info('Processador de NFe inicializado')
+        logger.info('Pasta XML: %s', self.pasta_xml)
+        logger.info('Pasta processados: %s', self.pasta_processados)
+        logger.info('Pasta erros: %s', self.pasta_erros)
+        logger.info('Banco de dados: %s', self.banco_dados)
+        logger.info('Busca recursiva: %s', "Ativada" if self.busca_recursiva else "Desativada")
 
     def criar_pastas(self):
         """Cria as pastas necessárias se não existirem"""
@@ -195,13 +630,30 @@ class ProcessadorNFe(FileSystemEventHandler):
         for pasta in pastas:
             if not pasta.exists():
                 pasta.mkdir(parents=True, exist_ok=True)
-                logging.info(f'Pasta criada: {pasta}')
+                logger.info('Pasta criada: %s', pasta)
 
     def inicializar_banco(self):
         """Inicializa o banco de dados SQLite com as tabelas necessárias"""
         try:
-            conn = sqlite3.connect(str(self.banco_dados))
-            cursor = conn.cursor()
+            # Manter uma única conexão persistente durante toda a vida do processador.
+            # Abrir/fechar uma conexão por arquivo pagava o custo de setup a cada NFe.
+            # isolation_level=None deixa o controle de transações explícito (BEGIN/COMMIT).
+            # check_same_thread=False porque os eventos do watchdog chegam em outra
+            # thread; o acesso continua serializado (varredura inicial termina antes
+            # do observer começar e os handlers rodam um por vez).
+            self.conexao = sqlite3.connect(
+                str(self.banco_dados),
+                isolation_level=None,
+                check_same_thread=False
+            )
+            cursor = self.conexao.cursor()
+
+            # Pragmas de desempenho: WAL permite leituras concorrentes e agrupa escritas,
+            # synchronous=NORMAL reduz fsyncs (seguro em WAL) e temp_store evita I/O temporário.
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+            cursor.execute('PRAGMA cache_size=-20000') # ~20 MB de páginas em memória
 
             # Tabela para cabeçalho da NFe
             cursor.execute("""
@@ -223,10 +675,16 @@ class ProcessadorNFe(FileSystemEventHandler):
                     valor_cofins REAL,
                     arquivo_xml TEXT,
                     caminho_original TEXT,
+                    hash_xml TEXT,
                     data_processamento DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """)
 
+            # Bancos criados antes da coluna hash_xml ganham a coluna aqui
+            colunas_cabecalho = [linha[1] for linha in cursor.execute('PRAGMA table_info(nfe_cabecalho)')]
+            if 'hash_xml' not in colunas_cabecalho:
+                cursor.execute('ALTER TABLE nfe_cabecalho ADD COLUMN hash_xml TEXT')
+
             # Tabela para itens da NFe
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS nfe_itens (
@@ -247,106 +705,33 @@ class ProcessadorNFe(FileSystemEventHandler):
                 )
             """)
 
-            conn.commit()
-            conn.close()
-            logging.info('Banco de dados inicializado com sucesso')
-
-        except Exception as e:
-            logging.error(f'Erro ao inicializar banco de dados: {e}')
-            exit(1)
-
-    def extrair_dados_nfe(self, xml_dict):
-        """Extrai dados da NFe do dicionário XML"""
-        try:
-            # Navegar pela estrutura do XML
-            nfe = xml_dict.get('NFe', {})
-            inf_nfe = nfe.get('infNFe', {})
-
-            # Dados de identificação
-            ide = inf_nfe.get('ide', {})
-
-            # Dados do emitente
-            emit = inf_nfe.get('emit', {})
-
-            # Dados do destinatário
-            dest = inf_nfe.get('dest', {})
-
-            # Totais
-            total = inf_nfe.get('total', {})
-            icms_tot = total.get('ICMSTot', {})
-
-            # Detalhes dos produtos
-            det = inf_nfe.get('det', [])
-            if not isinstance(det, list):
-                det = [det] # Se houver apenas um item, transformar em lista
-
-            # Extrair chave de acesso do ID
-            chave_acesso = inf_nfe.get('@Id', '').replace('NFe', '')
-
-            # Dados do cabeçalho
-            cabecalho = {
-                'chave_acesso': chave_acesso,
-                'numero_nf': ide.get('nNF', ''),
-                'serie': ide.get('serie', ''),
-                'data_emissao': self.converter_data(ide.get('dEmi', '')),
-                'data_saida_entrada': self.converter_data(ide.get('dSaiEnt', '')),
-                'tipo_operacao': ide.get('natOp', ''),
-                'cnpj_emitente': emit.get('CNPJ', ''),
-                'nome_emitente': emit.get('xNome', ''),
-                'cnpj_destinatario': dest.get('CNPJ', ''),
-                'nome_destinatario': dest.get('xNome', ''),
-                'valor_total': float(icms_tot.get('vNF', 0)),
-                'valor_icms': float(icms_tot.get('vICMS', 0)),
-                'valor_pis': float(icms_tot.get('vPIS', 0)),
-                'valor_cofins': float(icms_tot.get('vCOFINS', 0))
-            }
+            # Índice para o DELETE por chave_acesso feito a cada NFe salva;
+            # sem ele a limpeza dos itens vira uma varredura da tabela inteira
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_nfe_itens_chave
+                ON nfe_itens(chave_acesso)
+            """)
 
-            # Dados dos itens
-            itens = []
-            for item in det:
-                prod = item.get('prod', {})
-                imposto = item.get('imposto', {})
-
-                # Extrair impostos
-                icms = imposto.get('ICMS', {})
-                icms_tipo = next(iter(icms.values())) if icms else {}
-
-                pis = imposto.get('PIS', {})
-                pis_tipo = next(iter(pis.values())) if pis else {}
-
-                cofins = imposto.get('COFINS', {})
-                cofins_tipo = next(iter(cofins.values())) if cofins else {}
-
-                item_data = {
-                    'chave_acesso': chave_acesso,
-                    'numero_item': int(item.get('@nItem', 0)),
-                    'codigo_produto': prod.get('cProd', ''),
-                    'descricao_produto': prod.get('xProd', ''),
-                    'cfop': prod.get('CFOP', ''),
-                    'unidade_comercial': prod.get('uCom', ''),
-                    'quantidade_comercial': float(prod.get('qCom', 0)),
-                    'valor_unitario_comercial': float(prod.get('vUnCom', 0)),
-                    'valor_total_produto': float(prod.get('vProd', 0)),
-                    'valor_icms': float(icms_tipo.get('vICMS', 0)),
-                    'valor_pis': float(pis_tipo.get('vPIS', 0)),
-                    'valor_cofins': float(cofins_tipo.get('vCOFINS', 0))
-                }
-                itens.append(item_data)
+            # A restrição UNIQUE já cria um índice implícito no cabeçalho;
+            # este nomeado apenas torna a intenção explícita no schema
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_nfe_cabecalho_chave
+                ON nfe_cabecalho(chave_acesso)
+            """)
 
-            return cabecalho, itens
+            logger.info('Banco de dados inicializado com sucesso')
 
         except Exception as e:
-            logging.error(f'Erro ao extrair dados da NFe: {e}')
-            raise # Relança a exceção, fazendo com que ela suba para a função processar_xml, que foi quem chamou extrair_dados_nfe.
+            logger.error('Erro ao inicializar banco de dados: %s', e)
+            exit(1)
 
-    def converter_data(self, data_str):
-        """Converte string de data para formato SQLite"""
-        try:
-            if data_str:
-                return datetime.strptime(data_str, '%Y-%m-%d').date()
-            return None
-        except:
-            return None
+    def fechar(self):
+        """Fecha a conexão persistente com o banco de dados"""
+        if getattr(self, 'conexao', None) is not None:
+            self.confirmar_gravacoes_pendentes()
+            self.conexao.close()
+            self.conexao = None
+            logger.info('Conexão com o banco de dados fechada')
 
     def gerar_nome_unico(self, arquivo_original, pasta_destino):
         """
@@ -361,77 +746,112 @@ class ProcessadorNFe(FileSystemEventHandler):
         """
         nome_base = arquivo_original.stem
         extensao = arquivo_original.suffix
-        contador = 1
 
         # Começar com o nome original
         nome_destino = pasta_destino / arquivo_original.name
 
+        if not nome_destino.exists():
+            return nome_destino
+
+        # Lembrar o último contador usado por (pasta, nome) para que cada novo
+        # conflito comece de onde o anterior parou, em vez de refazer a sondagem
+        # desde 1 (que custava uma chamada de exists() por tentativa)
+        chave_contador = (str(pasta_destino), nome_base, extensao)
+        contador = self.contadores_nomes.get(chave_contador, 0) + 1
+
         # Se já existe, adicionar contador
+        nome_destino = pasta_destino / f'{nome_base}_{contador:03d}{extensao}'
         while nome_destino.exists():
-            novo_nome = f'{nome_base}_{contador:03d}-{extensao}'
-            nome_destino = pasta_destino / novo_nome
             contador += 1
+            nome_destino = pasta_destino / f'{nome_base}_{contador:03d}{extensao}'
 
+        self.contadores_nomes[chave_contador] = contador
         return nome_destino
 
-    def salvar_no_banco(self, cabecalho, itens, nome_arquivo, caminho_original):
-        """Salva os dados da NFe no banco de dados"""
+    def salvar_no_banco(self, cabecalho, itens, nome_arquivo, caminho_original, commit_imediato=True):
+        """
+        Salva os dados da NFe no banco de dados.
+
+        Args:
+            cabecalho (dict): Dados do cabeçalho da NFe
+            itens (list): Tuplas dos itens, na ordem das colunas do INSERT
+            nome_arquivo (str): Nome do arquivo XML processado
+            caminho_original: Caminho original do arquivo, para rastreabilidade
+            commit_imediato (bool): Se True (modo ao vivo), confirma a transação
+                já nesta chamada; se False (varredura inicial), acumula gravações
+                e confirma a cada commit_a_cada NFes, amortizando o fsync
+        """
         try:
-            conn = sqlite3.connect(str(self.banco_dados))
-            cursor = conn.cursor()
+            cursor = self.conexao.cursor()
 
             # Adicionar informações do arquivo ao cabeçalho
             cabecalho['arquivo_xml'] = nome_arquivo
             cabecalho['caminho_original'] = str(caminho_original)
 
-            # Inserir cabeçalho
-            cursor.execute("""
-                INSERT OR REPLACE INTO nfe_cabecalho (
-                    chave_acesso, numero_nf, serie, data_emissao,
-                    data_saida_entrada, tipo_operacao, cnpj_emitente, nome_emitente,
-                    cnpj_destinatario, nome_destinatario, valor_total, valor_icms,
-                    valor_pis, valor_cofins, arquivo_xml, caminho_original
-                ) VALUES (
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-                )
+            # Abrir a transação se ainda não há uma em andamento (no modo
+            # agrupado ela pode ter ficado aberta pela NFe anterior)
+            if not self.conexao.in_transaction:
+                cursor.execute('BEGIN IMMEDIATE')
+
+            # O savepoint isola esta NFe dentro da transação agrupada: uma falha
+            # desfaz só ela, preservando as NFes anteriores ainda não confirmadas
+            cursor.execute('SAVEPOINT nfe_atual')
 
-            """, (
+            # Inserir cabeçalho
+            cursor.execute(_SQL_INSERT_CABECALHO, (
                 cabecalho['chave_acesso'], cabecalho['numero_nf'], cabecalho['serie'], cabecalho['data_emissao'],
                 cabecalho['data_saida_entrada'], cabecalho['tipo_operacao'], cabecalho['cnpj_emitente'], cabecalho['nome_emitente'],
                 cabecalho['cnpj_destinatario'], cabecalho['nome_destinatario'], cabecalho['valor_total'], cabecalho['valor_icms'],
-                cabecalho['valor_pis'], cabecalho['valor_cofins'], cabecalho['arquivo_xml'], cabecalho['caminho_original']
+                cabecalho['valor_pis'], cabecalho['valor_cofins'], cabecalho['arquivo_xml'], cabecalho['caminho_original'],
+                cabecalho['hash_xml']
             ))
 
             # Remover itens existentes para esta chave de acesso
-            cursor.execute('DELETE FROM nfe_itens WHERE chave_acesso = ?', (cabecalho['chave_acesso'],))
-
-            # Inserir itens
-            for item in itens:
-                cursor.execute("""
-                    INSERT INTO nfe_itens (
-                        chave_acesso, numero_item, codigo_produto, descricao_produto,
-                        cfop, unidade_comercial, quantidade_comercial, valor_unitario_comercial,
-                        valor_total_produto, valor_icms, valor_pis, valor_cofins
-                    ) VALUES (
-                        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-                    )
-                """, (
-                    item['chave_acesso'], item['numero_item'], item['codigo_produto'], item['descricao_produto'],
-                    item['cfop'], item['unidade_comercial'], item['quantidade_comercial'], item['valor_unitario_comercial'],
-                    item['valor_total_produto'], item['valor_icms'], item['valor_pis'], item['valor_cofins']
-                ))
-
-            conn.commit()
-            conn.close()
-
-            logging.info(f'NFe salva no banco: {cabecalho["numero_nf"]} - {len(itens)} itens')
+            cursor.execute(_SQL_DELETE_ITENS, (cabecalho['chave_acesso'],))
+
+            # Inserir todos os itens de uma vez com executemany, em vez de um
+            # execute por item (cada execute paga parse/bind da instrução).
+            # Os itens já chegam como tuplas na ordem das colunas do INSERT.
+            cursor.executemany(_SQL_INSERT_ITEM, itens)
+
+            cursor.execute('RELEASE nfe_atual')
+
+            if commit_imediato:
+                cursor.execute('COMMIT')
+                self.gravacoes_pendentes = 0
+            else:
+                self.gravacoes_pendentes += 1
+                if self.gravacoes_pendentes >= self.commit_a_cada:
+                    cursor.execute('COMMIT')
+                    self.gravacoes_pendentes = 0
+
+            logger.info('NFe salva no banco: %s - %s itens', cabecalho["numero_nf"], len(itens))
 
         except Exception as e:
-            logging.error(f'Erro ao salvar no banco de dados: {e}')
+            # Desfazer apenas a NFe atual, mantendo as anteriores da transação
+            if self.conexao.in_transaction:
+                self.conexao.execute('ROLLBACK TO nfe_atual')
+                self.conexao.execute('RELEASE nfe_atual')
+            logger.error('Erro ao salvar no banco de dados: %s', e)
             raise # Relança a exceção, fazendo com que ela suba para a função processar_xml, que foi quem chamou salvar_no_banco.
 
-    def processar_xml(self, arquivo_xml):
-        """Processa um arquivo XML de NFe"""
+    def confirmar_gravacoes_pendentes(self):
+        """Confirma a transação agrupada que ficou aberta no modo de varredura"""
+        if self.conexao.in_transaction:
+            self.conexao.execute('COMMIT')
+        self.gravacoes_pendentes = 0
+
+    def processar_xml(self, arquivo_xml, dados_extraidos=None, commit_imediato=True):
+        """
+        Processa um arquivo XML de NFe.
+
+        Args:
+            arquivo_xml (Path): Arquivo a processar
+            dados_extraidos (tuple, optional): Par (cabecalho, itens) já extraído
+                em outro processo; quando informado, o XML não é lido de novo
+            commit_imediato (bool): Repassado a salvar_no_banco; False permite
+                agrupar commits durante a varredura inicial
+        """
         try:
             # Obter caminho relativo à pasta base de XML para logging
             try:
@@ -439,26 +859,32 @@ class ProcessadorNFe(FileSystemEventHandler):
             except ValueError:
                 caminho_relativo = arquivo_xml.name
 
-            logging.info(f'Processando arquivo: {caminho_relativo}')
+            logger.info('Processando arquivo: %s', caminho_relativo)
 
-            # Ler e processar XML
-            with open(arquivo_xml, 'r', encoding='utf-8') as f:
-                xml_content = f.read()
+            # Extrair dados lendo o XML de forma incremental
+            if dados_extraidos is None:
+                cabecalho, itens = extrair_dados_nfe_stream(arquivo_xml)
+            else:
+                cabecalho, itens = dados_extraidos
 
-            # Converter XML para dicionário
-            xml_dict = xmltodict.parse(xml_content)
+            # Reingestão do mesmo conteúdo (mesma chave e mesmo hash do XML)
+            # não precisa tocar o banco: basta arquivar o arquivo
+            duplicada = self.conexao.execute(
+                _SQL_CHECA_DUPLICATA,
+                (cabecalho['chave_acesso'], cabecalho['hash_xml'])
+            ).fetchone()
 
-            # Extrair dados
-            cabecalho, itens = self.extrair_dados_nfe(xml_dict)
-
-            # Salvar no banco
-            self.salvar_no_banco(cabecalho, itens, arquivo_xml.name, caminho_relativo)
+            if duplicada:
+                logger.info('NFe já processada (conteúdo idêntico): %s', cabecalho["numero_nf"])
+            else:
+                # Salvar no banco
+                self.salvar_no_banco(cabecalho, itens, arquivo_xml.name, caminho_relativo, commit_imediato=commit_imediato)
 
             # Mover arquivo para pasta de processados com nome único
             destino = self.gerar_nome_unico(arquivo_xml, self.pasta_processados)
-            shutil.move(str(arquivo_xml), str(destino))
+            _mover_rapido(arquivo_xml, destino)
 
-            logging.info(f'Arquivo processado com sucesso: {arquivo_xml.name}')
+            logger.info('Arquivo processado com sucesso: %s', arquivo_xml.name)
 
         except Exception as e:
             try:
@@ -466,74 +892,189 @@ class ProcessadorNFe(FileSystemEventHandler):
             except ValueError:
                 caminho_relativo = arquivo_xml.name
 
-            logging.error(f'Erro ao processar {caminho_relativo}: {e}')
+            logger.error('Erro ao processar %s: %s', caminho_relativo, e)
 
             # Mover arquivo para pasta de erros
             try:
                 destino_erro = self.gerar_nome_unico(arquivo_xml, self.pasta_erros)
-                shutil.move(str(arquivo_xml), str(destino_erro))
-                logging.info(f'Arquivo movido para pasta de erros: {arquivo_xml.name}')
+                _mover_rapido(arquivo_xml, destino_erro)
+                logger.info('Arquivo movido para pasta de erros: %s', arquivo_xml.name)
             except Exception as e2:
-                logging.error(f'Erro ao mover arquivo para pasta de erros: {e2}')
-
-    def on_created(self, event):
-        """Chamado quando um novo arquivo é criado"""
-        if not event.is_directory:
-            arquivo = Path(event.src_path)
+                logger.error('Erro ao mover arquivo para pasta de erros: %s', e2)
 
-            # Verificar se é arquivo XML
-            if arquivo.suffix.lower() != '.xml':
-                logging.debug(f'Arquivo ignorado (não é XML): {arquivo.name}')
-                return
+    def aguardar_arquivo_estavel(self, arquivo, intervalo=0.05, verificacoes=2, tempo_limite=5.0):
+        """
+        Aguarda o tamanho do arquivo parar de mudar, indicando cópia concluída.
 
-            # Verificar se o arquivo está dentro da pasta monitorada
-            try:
-                arquivo.relative_to(self.pasta_xml)
-            except ValueError:
-                logging.debug(f'Arquivo fora da pasta monitorada: {arquivo}')
-                return
+        Em vez de dormir um tempo fixo, consulta o tamanho em intervalos curtos
+        até ele se repetir algumas vezes seguidas.
 
-            # Aguardar um pouco para garantir que o arquivo foi completamente copiado
-            time.sleep(1)
+        Args:
+            arquivo (Path): Arquivo a observar
+            intervalo (float): Pausa entre verificações, em segundos
+            verificacoes (int): Quantas leituras iguais consecutivas são exigidas
+            tempo_limite (float): Tempo máximo de espera, em segundos
 
-            # Verificar se arquivo ainda existe
-            if not arquivo.exists():
-                logging.debug(f'Arquivo não existe mais: {arquivo.name}')
-                return
+        Returns:
+            bool: True se o arquivo estabilizou, False se sumiu ou o tempo esgotou
+        """
+        limite = time.monotonic() + tempo_limite
+        tamanho_anterior = -1
+        estaveis = 0
 
+        while time.monotonic() < limite:
             try:
-                caminho_relativo = arquivo.relative_to(self.pasta_xml)
-                logging.info(f'Novo arquivo XML detectado: {caminho_relativo}')
-            except ValueError:
-                logging.info(f'Novo arquivo XML detectado: {arquivo.name}')
+                tamanho = arquivo.stat().st_size
+            except OSError:
+                return False # Arquivo removido/renomeado durante a espera
+
+            if tamanho == tamanho_anterior:
+                estaveis += 1
+                if estaveis >= verificacoes:
+                    return True
+            else:
+                estaveis = 0
+                tamanho_anterior = tamanho
+
+            time.sleep(intervalo)
+
+        return False
+
+    def _tratar_novo_arquivo(self, arquivo, aguardar_copia=True):
+        """Processa um arquivo recém-detectado pelo monitoramento"""
+        # O filtro de extensão e de pasta já foi feito pelo watchdog
+        # (patterns=['*.xml'] no construtor)
+
+        # Aguardar a cópia terminar observando o tamanho do arquivo estabilizar
+        # (arquivos movidos/renomeados chegam completos e não precisam esperar)
+        if aguardar_copia and not self.aguardar_arquivo_estavel(arquivo):
+            logger.debug('Arquivo não estabilizou ou não existe mais: %s', arquivo.name)
+            return
+
+        # Verificar se arquivo ainda existe
+        if not arquivo.exists():
+            logger.debug('Arquivo não existe mais: %s', arquivo.name)
+            return
+
+        try:
+            caminho_relativo = arquivo.relative_to(self.pasta_xml)
+            logger.info('Novo arquivo XML detectado: %s', caminho_relativo)
+        except ValueError:
+            logger.info('Novo arquivo XML detectado: %s', arquivo.name)
 
-            self.processar_xml(arquivo)
+        self.processar_xml(arquivo)
+
+    def on_created(self, event):
+        """Chamado quando um novo arquivo é criado"""
+        # Mesmo em sistemas com eventos de close (inotify), o evento de criação
+        # precisa ser tratado: arquivos que chegam por rename vindo de fora da
+        # pasta observada aparecem só como criados (IN_MOVED_TO sem par vira
+        # criação) e nunca geram on_closed. A espera de estabilidade cobre os
+        # dois casos e, se o on_closed já tiver processado o arquivo antes, a
+        # verificação de existência torna o tratamento repetido inócuo.
+        self._tratar_novo_arquivo(Path(event.src_path))
+
+    def on_closed(self, event):
+        """Chamado quando um arquivo aberto para escrita é fechado (Linux)"""
+        # O escritor terminou: o arquivo está completo, sem espera nenhuma.
+        # Também cobre escritas mais longas que o tempo limite da espera de
+        # estabilidade, que o on_created desiste de acompanhar.
+        self._tratar_novo_arquivo(Path(event.src_path), aguardar_copia=False)
+
+    def on_moved(self, event):
+        """Chamado quando um arquivo é movido/renomeado para dentro da pasta"""
+        # Arquivos que chegam por rename atômico já estão completos,
+        # então não há espera de cópia
+        self._tratar_novo_arquivo(Path(event.dest_path), aguardar_copia=False)
 
     def processar_arquivos_existentes(self):
         """Processa arquivos XML que já estão na pasta"""
-        logging.info('Processando arquivos XML existentes...')
+        logger.info('Processando arquivos XML existentes...')
         arquivos_processados = 0
 
-        # Escolher método de busca baseado na configuração
-        if self.busca_recursiva:
-            # Busca recursiva em todas as subpastas
-            arquivos_xml = list(self.pasta_xml.rglob('*.xml'))
-        else:
-            # Busca apenas na pasta raiz
-            arquivos_xml = list(self.pasta_xml.glob('*xml'))
-
-        for arquivo in arquivos_xml:
-            if arquivo.is_file():
-                try:
-                    caminho_relativo = arquivo.relative_to(self.pasta_xml)
-                    logging.info(f'Processando arquivo existente: {caminho_relativo}')
-                except ValueError:
-                    logging.info(f'Processando arquivo existente: {arquivo.name}')
-
-                self.processar_xml(arquivo)
-                arquivos_processados += 1
-
-        logging.info(f'Processamento inicial concluído! {arquivos_processados} arquivos processados')
+        # Varredura em streaming: os arquivos vão sendo descobertos e consumidos
+        # em lotes, sem montar a lista completa em memória (a recursividade
+        # respeita a configuração busca_recursiva)
+        arquivos_xml = _iterar_arquivos_xml(self.pasta_xml, self.busca_recursiva)
+
+        # A extração do XML é o trecho pesado de CPU, então ela roda em paralelo
+        # num pool de processos; o banco e a movimentação de arquivos continuam
+        # no processo principal (SQLite com um único escritor). Os envios são
+        # feitos em lotes para não acumular resultados em memória.
+        tamanho_lote = 64
+
+        # Chaves de acesso já vistas nesta varredura: cópias repetidas da mesma
+        # NFe no backlog são arquivadas sem passar pelo parser de novo
+        chaves_vistas = set()
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            while True:
+                lote = list(itertools.islice(arquivos_xml, tamanho_lote))
+                if not lote:
+                    break
+
+                # Descartar duplicatas pela chave lida do início do arquivo,
+                # antes de gastar leitura completa e extração com elas
+                lote_inedito = []
+                for arquivo in lote:
+                    chave = _chave_acesso_rapida(arquivo)
+                    if chave in chaves_vistas:
+                        logger.info('NFe duplicada no backlog, arquivando sem reprocessar: %s', arquivo.name)
+                        try:
+                            destino = self.gerar_nome_unico(arquivo, self.pasta_processados)
+                            _mover_rapido(arquivo, destino)
+                        except OSError as e:
+                            logger.error('Erro ao arquivar duplicata %s: %s', arquivo.name, e)
+                        continue
+                    if chave is not None:
+                        chaves_vistas.add(chave)
+                    lote_inedito.append(arquivo)
+
+                # Ler o lote inteiro com leituras sobrepostas e mandar só os
+                # bytes para o pool: os workers ficam 100% na extração, sem
+                # esperar disco um arquivo por vez
+                futuros = {}
+                for arquivo, conteudo in _ler_arquivos(lote_inedito):
+                    if conteudo is None:
+                        logger.error('Erro ao ler arquivo: %s', arquivo)
+                        continue
+                    futuros[executor.submit(extrair_dados_nfe_bytes, conteudo)] = arquivo
+
+                for futuro in concurrent.futures.as_completed(futuros):
+                    arquivo = futuros[futuro]
+
+                    try:
+                        caminho_relativo = arquivo.relative_to(self.pasta_xml)
+                        logger.info('Processando arquivo existente: %s', caminho_relativo)
+                    except ValueError:
+                        logger.info('Processando arquivo existente: %s', arquivo.name)
+
+                    try:
+                        dados_extraidos = futuro.result()
+                        # Registrar também chaves que a leitura rápida não achou
+                        # (ex.: cabeçalho XML longo antes do atributo Id)
+                        chaves_vistas.add(dados_extraidos[0]['chave_acesso'])
+                    except Exception as e:
+                        # Falha na extração: registrar e mover para a pasta de erros,
+                        # como o processamento sequencial faria
+                        logger.error('Erro ao processar %s: %s', arquivo.name, e)
+                        try:
+                            destino_erro = self.gerar_nome_unico(arquivo, self.pasta_erros)
+                            _mover_rapido(arquivo, destino_erro)
+                            logger.info('Arquivo movido para pasta de erros: %s', arquivo.name)
+                        except Exception as e2:
+                            logger.error('Erro ao mover arquivo para pasta de erros: %s', e2)
+                        continue
+
+                    # Na varredura inicial os commits são agrupados: o fsync é
+                    # pago a cada commit_a_cada NFes, não a cada arquivo
+                    self.processar_xml(arquivo, dados_extraidos=dados_extraidos, commit_imediato=False)
+                    arquivos_processados += 1
+
+        # Confirmar o que restou da última leva antes de voltar ao modo ao vivo
+        self.confirmar_gravacoes_pendentes()
+
+        logger.info('Processamento inicial concluído! %s arquivos processados', arquivos_processados)
 
 def main():
     try:
@@ -543,21 +1084,21 @@ def main():
         # Configurar logging usando as configurações carregadas
         configurar_logging(configuracoes['logging'])
 
-        logging.info('Iniciando processador de NFe...')
+        logger.info('Iniciando processador de NFe...')
 
         # Criar o processador
         processador = ProcessadorNFe(configuracoes['processador'])
 
-        logging.info(f'Diretório base: {processador.base_dir}')
-        logging.info(f'Monitorando pasta: {processador.pasta_xml}')
-        logging.info(f'Pasta processados: {processador.pasta_processados}')
-        logging.info(f'Pasta erros: {processador.pasta_erros}')
-        logging.info(f'Banco de dados: {processador.banco_dados}')
-        logging.info('=' * 60)
+        logger.info('Diretório base: %s', processador.base_dir)
+        logger.info('Monitorando pasta: %s', processador.pasta_xml)
+        logger.info('Pasta processados: %s', processador.pasta_processados)
+        logger.info('Pasta erros: %s', processador.pasta_erros)
+        logger.info('Banco de dados: %s', processador.banco_dados)
+        logger.info('=' * 60)
 
         # Processar arquivos existentes
         processador.processar_arquivos_existentes()
-        logging.info('=' * 60)
+        logger.info('=' * 60)
 
         # Configurar o observer
         observer = Observer()
@@ -570,18 +1111,18 @@ def main():
 
         observer.start()
 
-        logging.info('Monitoramento ativo! Pressione Ctrl+C para parar.')
-        logging.info('=' * 60)
+        logger.info('Monitoramento ativo! Pressione Ctrl+C para parar.')
+        logger.info('=' * 60)
 
         # Manter o programa rodando
         while True:
             time.sleep(1)
 
     except KeyboardInterrupt:
-        logging.info('Interrupção detectada - Parando o monitoramento...')
+        logger.info('Interrupção detectada - Parando o monitoramento...')
         observer.stop()
     except Exception as e:
-        logging.error(f'Erro inesperado: {str(e)}')
+        logger.error('Erro inesperado: %s', str(e))
         # Verifica se a variável observer foi definida no escopo local da função main() antes de tentar usá-la.
         # Por quê?
         # Se ocorrer uma exceção antes da linha observer = Observer(), a variável observer não existirá ainda.
@@ -598,7 +1139,11 @@ def main():
         # Quando você chama observer.stop(), pede para o monitoramento parar.
         # Faz o programa principal esperar até que a thread do observer termine de fato, garantindo um encerramento limpo e seguro.
 
-    logging.info('Processador de NFe finalizado com sucesso!')
+    # Fechar a conexão persistente com o banco, se o processador chegou a ser criado
+    if 'processador' in locals():
+        processador.fechar()
+
+    logger.info('Processador de NFe finalizado com sucesso!')
 
 if __name__ == '__main__':
     main()